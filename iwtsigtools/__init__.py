@@ -14,11 +14,18 @@ except PackageNotFoundError:
     # package is not installed
     pass
 
+from .batch import estimate_peak_memory, run_batch
+from .features import export_features, extract_features
 from .filehandling import (get_start_from_filename, load_mesusoft_measurement,
                            save_dataframe_to_tdms, ui_get_file_name, 
-                           export_chunks)
+                           export_chunks, get_sampling_rate, get_time,
+                           has_time_channel, is_implicit_time)
 from .idle import (detect_idle, detect_leading_idle, detect_nonidle,
                    split_on_idle, split_on_ranges)
 from .logging import get_logger, start_logger
 from .normalization import normalize, normalize_to_interval
-from .processdataframe import process_dataframe
+from .pipeline import Pipeline
+from .processdataframe import (chop_dataframe, detect_cutting_ranges,
+                               detect_force_ranges, process_dataframe,
+                               resulting_force)
+from .segments import Segments
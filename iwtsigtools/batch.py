@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+"""
+Memory-budget-aware batch processing of measurement files.
+
+Copyright (C) 2022  Lars Schönemann
+Leibniz Institut für Werkstofforientierte Technologien IWT, Bremen, Germany
+
+Permission is hereby granted, free of charge, to any person obtaining a copy 
+of this software and associated documentation files (the "Software"), to deal 
+in the Software without restriction, including without limitation the rights 
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell 
+copies of the Software, and to permit persons to whom the Software is 
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all 
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, 
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE 
+SOFTWARE.
+"""
+import logging
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+
+import nptdms
+
+from .filehandling import (export_chunks, get_start_from_filename,
+                           has_time_channel, load_mesusoft_measurement)
+from .features import export_features, extract_features
+from .idle import split_on_ranges
+from .processdataframe import detect_cutting_ranges
+
+log = logging.getLogger(__package__)
+
+# peak memory of load -> detect -> export relative to the raw channel data
+# (TDMS buffers, dataframe copy, resulting force, export conversion and the
+# temporary arrays of the chunk features)
+DEFAULT_EXPANSION_FACTOR = 6.0
+
+def estimate_peak_memory(file_name, expansion_factor=DEFAULT_EXPANSION_FACTOR,
+                         implicit_time=False):
+    """Estimate the peak memory needed for processing a MesuSoft measurement.
+    Only the TDMS metadata is read, i.e. sample count, channels and dtype.
+
+    Args:
+        file_name (str): the name of the TDMS file
+        expansion_factor (float, optional): peak memory of the pipeline 
+                                            relative to the raw data. 
+                                            Defaults to 6.0.
+        implicit_time (bool, optional): the time channel is not loaded, see 
+                                        load_mesusoft_measurement(). 
+                                        Defaults to False.
+
+    Returns:
+        int: estimated peak memory in bytes
+    """
+    tdms_file = nptdms.TdmsFile.read_metadata(file_name)
+    # only the first group is loaded (should be "Measuring")
+    group = tdms_file.groups()[0]
+    channels = group.channels()
+    # the time channel is not loaded with implicit time
+    if implicit_time and has_time_channel(group):
+        channels = channels[1:]
+    raw_bytes = sum(
+        len(channel) * channel.dtype.itemsize for channel in channels)
+    return int(raw_bytes * expansion_factor)
+
+def _process_file(file_name, export_dir, **kwargs):
+    # load -> detect -> export for one file, runs in a worker process
+    start_time = time.perf_counter()
+    measurement_df, metadata = load_mesusoft_measurement(
+        Path(file_name), kwargs.get('implicit_time', False))
+    if 'SamplingRate' in metadata['GroupProperties']:
+        kwargs['sampling_rate'] = metadata['GroupProperties']['SamplingRate']
+    
+    ranges = detect_cutting_ranges(measurement_df, **kwargs)
+    cutting_signals = split_on_ranges(measurement_df, ranges, keep_idle=0)
+    log.info(f'Detected {len(cutting_signals)} nonidle segments.')
+    start_num = get_start_from_filename(
+        file_name, len(cutting_signals), kwargs.get('identifier', 'n'))
+    export_name = Path(export_dir).joinpath(Path(file_name).name)
+    export_chunks(export_name, metadata, cutting_signals, start_num)
+    if kwargs.get('features', True):
+        export_features(
+            export_name, extract_features(measurement_df, ranges, **kwargs))
+    return len(cutting_signals), time.perf_counter() - start_time
+
+def _next_job(pending, free_memory):
+    # pending is sorted by decreasing size, take the largest job that fits
+    # into the remaining budget so small files fill up the gaps
+    for i, (_, estimate) in enumerate(pending):
+        if estimate <= free_memory:
+            return pending.pop(i)
+    return None
+
+def run_batch(file_names, export_dir, memory_budget, **kwargs):
+    """Process measurement files in parallel within a memory budget.
+    Each file is loaded, split on idle (see chop_dataframe()) and its chunks 
+    are exported to export_dir. A file is only started while the sum of the 
+    estimated peak memory of all running files stays below memory_budget. 
+    A file exceeding the budget on its own is run alone.
+
+    Args:
+        file_names (list of str): the TDMS files to process
+        export_dir (str): directory for the exported chunks
+        memory_budget (int): RAM budget in bytes
+        max_workers (int, optional): maximum number of worker processes. 
+                                     Defaults to the number of CPUs.
+        expansion_factor (float, optional): see estimate_peak_memory()
+        implicit_time (bool, optional): load without the time channel, see 
+                                        load_mesusoft_measurement(). 
+                                        Defaults to False.
+        num_workers: ignored, the idle detection of each file is serial
+        features (bool, optional): also save the chunk features, see 
+                                   extract_features(). Defaults to True.
+        **kwargs: passed on to chop_dataframe() and extract_features()
+
+    Returns:
+        list of dict: one report per file (in order of file_names) with 
+                      keys 'file_name', 'estimated_memory', 'wait_time', 
+                      'run_time', 'num_chunks' and 'error'
+    """
+    max_workers = kwargs.pop('max_workers', None) or os.cpu_count() or 1
+    expansion_factor = kwargs.pop('expansion_factor', 
+                                  DEFAULT_EXPANSION_FACTOR)
+    # files are already processed in parallel, a sharded idle detection in 
+    # every worker would multiply the processes and signal copies beyond 
+    # the memory estimate
+    if kwargs.get('num_workers', 1) != 1:
+        log.warning('num_workers is ignored by run_batch(), using 1')
+    kwargs['num_workers'] = 1
+    
+    reports = {
+        file_name: {'file_name': file_name,
+                    'estimated_memory': None,
+                    'wait_time': None,
+                    'run_time': None,
+                    'num_chunks': None,
+                    'error': None}
+        for file_name in file_names}
+    pending = []
+    for file_name, report in reports.items():
+        try:
+            report['estimated_memory'] = estimate_peak_memory(
+                file_name, expansion_factor, 
+                kwargs.get('implicit_time', False))
+        except Exception as estimate_exception:  # pylint: disable=W0703
+            log.error(f'Reading metadata of {file_name} failed: '
+                      f'{estimate_exception}')
+            report['error'] = estimate_exception
+            continue
+        pending.append((file_name, report['estimated_memory']))
+    pending.sort(key=lambda job: job[1], reverse=True)
+    log.info(f'Scheduling {len(pending)} files with a memory budget of '
+             f'{memory_budget / 2**20:.0f} MiB')
+    
+    queued_at = time.perf_counter()
+    running = {}
+    memory_in_use = 0
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        while pending or running:
+            while pending and len(running) < max_workers:
+                job = _next_job(pending, memory_budget - memory_in_use)
+                if job is None and not running:
+                    job = pending.pop(0)
+                    log.warning(
+                        f'{job[0]} needs an estimated {job[1] / 2**20:.0f} '
+                        f'MiB which exceeds the memory budget, running alone')
+                if job is None:
+                    break
+                file_name, estimate = job
+                reports[file_name]['wait_time'] = \
+                    time.perf_counter() - queued_at
+                future = executor.submit(
+                    _process_file, file_name, export_dir, **kwargs)
+                running[future] = job
+                memory_in_use += estimate
+                log.debug(f'Started {file_name}, {memory_in_use / 2**20:.0f} '
+                          f'MiB of budget in use')
+            
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                file_name, estimate = running.pop(future)
+                memory_in_use -= estimate
+                try:
+                    (reports[file_name]['num_chunks'], 
+                     reports[file_name]['run_time']) = future.result()
+                except Exception as process_exception:  # pylint: disable=W0703
+                    log.error(f'Processing {file_name} failed: '
+                              f'{process_exception}')
+                    reports[file_name]['error'] = process_exception
+    
+    wait_times = [report['wait_time'] for report in reports.values() 
+                  if report['wait_time'] is not None]
+    if wait_times:
+        log.info(f'Finished {len(wait_times)} files, queue wait time '
+                 f'max {max(wait_times):.1f} s, '
+                 f'mean {sum(wait_times) / len(wait_times):.1f} s')
+    return [reports[file_name] for file_name in file_names]
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+Per-chunk feature extraction using segmented reductions.
+
+Copyright (C) 2022  Lars Schönemann
+Leibniz Institut für Werkstofforientierte Technologien IWT, Bremen, Germany
+
+Permission is hereby granted, free of charge, to any person obtaining a copy 
+of this software and associated documentation files (the "Software"), to deal 
+in the Software without restriction, including without limitation the rights 
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell 
+copies of the Software, and to permit persons to whom the Software is 
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all 
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, 
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE 
+SOFTWARE.
+"""
+import logging
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .filehandling import get_sampling_rate
+from .processdataframe import resulting_force
+from .segments import Segments
+
+log = logging.getLogger(__package__)
+
+def _segment_reduce(ufunc, values, ranges):
+    # reduce values (samples x channels) over every range at once, the zero
+    # row appended allows ranges ending at the last sample
+    padded = np.vstack((values, np.zeros((1, values.shape[1]))))
+    reduced = ufunc.reduceat(padded, np.asarray(ranges).ravel(), axis=0)
+    # every second row is the gap between two ranges
+    return reduced[::2]
+
+def _dominant_frequency(signal, ranges, sampling_rate, nfft, batch_size):
+    # batched FFT over a Hann-windowed block of up to nfft samples taken 
+    # from the middle of every range
+    lengths = np.minimum(ranges.lengths, nfft)
+    offsets = ranges.starts + (ranges.lengths - lengths) // 2
+    samples = np.arange(nfft)
+    frequencies = np.fft.rfftfreq(nfft, 1 / sampling_rate)
+    
+    dominant = np.full(len(ranges), np.nan)
+    for first in range(0, len(ranges), batch_size):
+        block = slice(first, first + batch_size)
+        valid = samples < lengths[block, None]
+        frames = np.where(
+            valid, 
+            signal[np.minimum(offsets[block, None] + samples, 
+                              len(signal) - 1)],
+            0.0)
+        frames -= (frames.sum(axis=1, keepdims=True) 
+                   / np.maximum(lengths[block, None], 1))
+        window = 0.5 - 0.5 * np.cos(
+            2 * np.pi * samples / np.maximum(lengths[block, None] - 1, 1))
+        spectrum = np.abs(np.fft.rfft(np.where(valid, frames * window, 0.0), 
+                                      axis=1))
+        spectrum[:, 0] = 0.0
+        dominant[block] = frequencies[np.argmax(spectrum, axis=1)]
+    
+    dominant[lengths < 2] = np.nan
+    return dominant
+
+def extract_features(measurement_df, ranges, **kwargs):
+    """Calculate statistics of all chunks of a measurement at once.
+    For every channel and the resulting force (see resulting_force()) mean, 
+    RMS and peak (maximum absolute value) are calculated, as well as the 
+    duration and the dominant frequency (e.g. of the spindle) of each chunk.
+
+    Args:
+        measurement_df (pd.dataframe): the whole measurement
+        ranges (Segments or list): the chunks as index ranges [start, end], 
+                                   e.g. from detect_nonidle()
+        sampling_rate (float, optional): Defaults to the inverse of the 
+                                         first index step.
+        spectral_column (str, optional): channel for the dominant frequency. 
+                                         Defaults to the first column.
+        nfft (int, optional): samples per chunk used for the dominant 
+                              frequency. Defaults to 4096.
+        batch_size (int, optional): number of chunks per FFT batch. 
+                                    Defaults to 256.
+
+    Returns:
+        pd.dataframe: one row per chunk
+    """
+    sampling_rate = kwargs.get(
+        'sampling_rate', 
+        get_sampling_rate(measurement_df))
+    spectral_column = kwargs.get('spectral_column', measurement_df.columns[0])
+    
+    ranges = Segments(ranges).clip(0, len(measurement_df))
+    lengths = ranges.lengths
+    num_samples = np.where(lengths > 0, lengths, np.nan)[:, None]
+    
+    values = measurement_df.to_numpy(dtype=np.float64)
+    values = np.column_stack((
+        values, resulting_force(measurement_df).to_numpy(dtype=np.float64)))
+    channels = list(measurement_df.columns) + ['F_res']
+    
+    # empty chunks have no samples and thus no time, e.g. at the very end
+    times = np.full((len(ranges), 2), np.nan)
+    times[lengths > 0] = ranges[lengths > 0].to_time(
+        measurement_df.index, 
+        measurement_df.attrs.get('wf_increment'),
+        measurement_df.attrs.get('wf_start_offset', 0.0))
+    features = {
+        'start': ranges.starts,
+        'end': ranges.ends,
+        'start_time': times[:, 0],
+        'end_time': times[:, 1],
+        'duration': lengths / sampling_rate,
+    }
+    if len(ranges):
+        means = _segment_reduce(np.add, values, ranges) / num_samples
+        rms = np.sqrt(
+            _segment_reduce(np.add, values**2, ranges) / num_samples)
+        peaks = _segment_reduce(np.maximum, np.abs(values), ranges)
+        peaks[lengths == 0] = np.nan
+    else:
+        means = rms = peaks = np.empty((0, len(channels)))
+    for i, channel in enumerate(channels):
+        features[f'{channel}_mean'] = means[:, i]
+        features[f'{channel}_rms'] = rms[:, i]
+        features[f'{channel}_peak'] = peaks[:, i]
+    
+    features['dominant_frequency'] = _dominant_frequency(
+        measurement_df[spectral_column].to_numpy(dtype=np.float64),
+        ranges,
+        sampling_rate,
+        kwargs.get('nfft', 4096),
+        kwargs.get('batch_size', 256))
+    
+    return pd.DataFrame(features)
+
+def export_features(file_name, features_df):
+    """Save the chunk features as CSV next to the exported chunks.
+
+    Args:
+        file_name (str): The file's name as passed to export_chunks(), 
+                         the table is saved as <stem>_features.csv
+        features_df (pd.dataframe): the features, see extract_features()
+    """
+    features_file = Path(file_name).parent.joinpath(
+        f'{Path(file_name).stem}_features.csv')
+    features_df.to_csv(features_file, index_label='chunk')
+    log.info(f'Saved features of {len(features_df)} chunks to '
+             f'{features_file}')
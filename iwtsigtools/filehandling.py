@@ -33,11 +33,34 @@ import pandas as pd
 
 log = logging.getLogger(__package__)
 
-def load_mesusoft_measurement(file_name):
+def has_time_channel(group):
+    """Check if the first channel of a TDMS group is the time axis.
+    This is the case if it is named 'Time' or if it is not a waveform 
+    channel. Only files without a time channel, e.g. chunks exported with 
+    implicit time, carry the time axis as waveform properties 
+    ('wf_increment') on the first channel only.
+
+    Args:
+        group (nptdms.TdmsGroup): the group, e.g. "Measuring"
+
+    Returns:
+        bool: True if the first channel holds the time
+    """
+    first_channel = group.channels()[0]
+    return (first_channel.name == 'Time' 
+            or 'wf_increment' not in first_channel.properties)
+
+def load_mesusoft_measurement(file_name, implicit_time=False):
     """Load a measurement made in MesuSoft and saved as TDMS
 
     Args:
         file_name (str): the name of the file to load
+        implicit_time (bool, optional): do not load the time channel, the 
+                                        index holds the sample offset and 
+                                        start time and increment are kept 
+                                        in dataframe.attrs as 
+                                        'wf_start_offset' and 'wf_increment'. 
+                                        Defaults to False.
         
     Returns:
         dataframe: measurement dataframe
@@ -55,9 +78,31 @@ def load_mesusoft_measurement(file_name):
             f'Group {group_name} has the following channels: '
             f'{group.channels()}')
         
-        measurement_df = group.as_dataframe()
-        # set index to first columns (should be "Time")
-        measurement_df.set_index(measurement_df.columns[0], inplace=True)
+        channels = group.channels()
+        if implicit_time:
+            # time axis from the first sample of the time channel (should 
+            # be "Time") or, without one, from the waveform properties
+            if has_time_channel(group):
+                time_channel = channels.pop(0)
+                start_offset = float(time_channel[0])
+                increment = 1/group.properties['SamplingRate'] \
+                    if 'SamplingRate' in group.properties \
+                    else float(time_channel[1] - time_channel[0])
+            else:
+                start_offset = channels[0].properties.get(
+                    'wf_start_offset', 0.0)
+                increment = channels[0].properties['wf_increment']
+            measurement_df = pd.DataFrame(
+                {channel.name: channel[:] for channel in channels})
+            measurement_df.attrs['wf_start_offset'] = start_offset
+            measurement_df.attrs['wf_increment'] = increment
+        elif has_time_channel(group):
+            measurement_df = group.as_dataframe()
+            # set index to first columns (should be "Time")
+            measurement_df.set_index(measurement_df.columns[0], inplace=True)
+        else:
+            # no time channel, e.g. chunks exported with implicit time
+            measurement_df = group.as_dataframe(time_index=True)
 
         log.info(f'Read to dataframe with columns {measurement_df.columns}')
         
@@ -68,6 +113,40 @@ def load_mesusoft_measurement(file_name):
     }
     return measurement_df, metadata
 
+def is_implicit_time(dataframe):
+    """Check if a dataframe has an implicit time axis, i.e. its index is 
+    the sample offset, see load_mesusoft_measurement()"""
+    return 'wf_increment' in dataframe.attrs
+
+def get_sampling_rate(dataframe):
+    """Get the sampling rate of a measurement.
+
+    Args:
+        dataframe (pd.dataframe): measurement with time or implicit time 
+                                  as index
+
+    Returns:
+        float: sampling rate
+    """
+    if is_implicit_time(dataframe):
+        return 1/dataframe.attrs['wf_increment']
+    return 1/(dataframe.index[1]-dataframe.index[0])
+
+def get_time(dataframe):
+    """Get the time of each sample of a measurement.
+
+    Args:
+        dataframe (pd.dataframe): measurement with time or implicit time 
+                                  as index
+
+    Returns:
+        np.ndarray: time values
+    """
+    if is_implicit_time(dataframe):
+        return (dataframe.attrs['wf_start_offset'] 
+                + dataframe.index.to_numpy() * dataframe.attrs['wf_increment'])
+    return dataframe.index.to_numpy()
+
 def save_dataframe_to_tdms(filename, dataframe, metadata=None):
     """Save a dataframe to a TDMS file.
     Intended for force measurements with measurment time as index.
@@ -76,7 +155,9 @@ def save_dataframe_to_tdms(filename, dataframe, metadata=None):
         filename (str): the file name
         dataframe (pd.dataframe): the dataframe to save, 
                                   Note: The index is always saved as an 
-                                  additional column 'Time'
+                                  additional column 'Time', unless the 
+                                  dataframe has an implicit time axis 
+                                  which is saved as waveform properties
         metadata (dict): metadata to save, preferrably of the original TDMS
     """
     if metadata is None:
@@ -88,19 +169,33 @@ def save_dataframe_to_tdms(filename, dataframe, metadata=None):
         metadata['GroupName'], 
         properties=metadata['GroupProperties'])
     
-    channel_objects = [nptdms.ChannelObject(
-        metadata['GroupName'], sig, list(dataframe[sig]), properties={})
-        for sig in dataframe]
-
-    time_object = nptdms.ChannelObject(
-        metadata['GroupName'], 'Time', list(dataframe.index), properties={})
+    if is_implicit_time(dataframe):
+        # the index is the sample offset of this chunk, the time axis is 
+        # saved as waveform properties instead of a 'Time' channel
+        waveform_properties = {
+            'wf_start_offset': (
+                dataframe.attrs['wf_start_offset'] 
+                + (dataframe.index[0] if len(dataframe) else 0)
+                * dataframe.attrs['wf_increment']),
+            'wf_increment': dataframe.attrs['wf_increment'],
+            'wf_samples': len(dataframe)}
+        channel_objects = [nptdms.ChannelObject(
+            metadata['GroupName'], sig, dataframe[sig].to_numpy(), 
+            properties=waveform_properties)
+            for sig in dataframe]
+        first_segment = [root_object, group_object]
+    else:
+        channel_objects = [nptdms.ChannelObject(
+            metadata['GroupName'], sig, list(dataframe[sig]), properties={})
+            for sig in dataframe]
+        time_object = nptdms.ChannelObject(
+            metadata['GroupName'], 'Time', list(dataframe.index), 
+            properties={})
+        first_segment = [root_object, group_object, time_object]
 
     with nptdms.TdmsWriter(filename) as tdms_writer:
         # Write first segment
-        tdms_writer.write_segment([
-                root_object,
-                group_object,
-                time_object])
+        tdms_writer.write_segment(first_segment)
         for channel_object in channel_objects:
             tdms_writer.write_segment([
                 channel_object])
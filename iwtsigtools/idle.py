@@ -29,50 +29,49 @@ SOFTWARE.
 """
 import itertools
 import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 import numpy as np
 
+from .segments import Segments
+
 log = logging.getLogger(__package__)
 
 def _get_idle_ranges(min_idle_len, seek_step, idle_starts):
     # combine the silence we detected into ranges (start index - end index)
-    idle_ranges = []
-
-    prev_i = idle_starts.pop(0)
-    current_range_start = prev_i
-
-    for idle_start_i in idle_starts:
-        continuous = (idle_start_i == prev_i + seek_step)
-
-        # sometimes two small blips are enough for one particular slice to be
-        # non-idle, despite the idle parts all running together. Just combine
-        # the two overlapping idle ranges.
-        idle_has_gap = idle_start_i > (prev_i + min_idle_len)
-
-        if not continuous and idle_has_gap:
-            idle_ranges.append([current_range_start,
-                                prev_i + min_idle_len])
-            current_range_start = idle_start_i
-        prev_i = idle_start_i
-
-    idle_ranges.append([current_range_start,
-                        prev_i + min_idle_len])
-                        
-    return idle_ranges
-
-def _get_idle_starts(signal, min_idle_len, idle_thresh, seek_step, use_rms):
-    # find idle and add start and end indicies to the to_cut list
-    idle_starts = []
-
+    idle_starts = np.asarray(idle_starts, dtype=np.int64)
+    steps = np.diff(idle_starts)
+    continuous = steps == seek_step
+
+    # sometimes two small blips are enough for one particular slice to be
+    # non-idle, despite the idle parts all running together. Just combine
+    # the two overlapping idle ranges.
+    idle_has_gap = steps > min_idle_len
+
+    new_range = ~continuous & idle_has_gap
+    return Segments.from_bounds(
+        np.concatenate((idle_starts[:1], idle_starts[1:][new_range])),
+        np.concatenate((idle_starts[:-1][new_range], idle_starts[-1:]))
+        + min_idle_len)
+
+def _get_slice_starts(len_signal, min_idle_len, seek_step):
     # check successive (1 sample by default) chunk of signal for idle
     # try a chunk at every "seek step" (or every chunk for a seek step == 1)
-    last_slice_start = len(signal) - min_idle_len
+    last_slice_start = len_signal - min_idle_len
     slice_starts = range(0, last_slice_start + 1, seek_step)
 
     # guarantee last_slice_start is included in the range
     # to make sure the last portion of the audio is searched
+    extra_slice_starts = range(0)
     if last_slice_start % seek_step:
-        slice_starts = itertools.chain(slice_starts, [last_slice_start])
+        extra_slice_starts = range(last_slice_start, last_slice_start + 1)
+
+    return slice_starts, extra_slice_starts
+
+def _check_slices(signal, slice_starts, min_idle_len, idle_thresh, use_rms):
+    # find idle and add start and end indicies to the to_cut list
+    idle_starts = []
 
     for i in slice_starts:
         thissignal = signal.iloc[i:i + min_idle_len]
@@ -85,12 +84,71 @@ def _get_idle_starts(signal, min_idle_len, idle_thresh, seek_step, use_rms):
     
     return idle_starts
 
+def _check_shard(shard, offset, slice_starts, min_idle_len, idle_thresh, 
+                 use_rms):
+    # the shard begins at sample offset of the whole signal, slice_starts are
+    # relative to the shard, which carries a halo of min_idle_len samples
+    idle_starts = _check_slices(
+        shard, slice_starts, min_idle_len, idle_thresh, use_rms)
+    return [i + offset for i in idle_starts]
+
+def _get_idle_starts(signal, min_idle_len, idle_thresh, seek_step, use_rms):
+    slice_starts, extra_slice_starts = _get_slice_starts(
+        len(signal), min_idle_len, seek_step)
+    
+    return _check_slices(signal, 
+                         itertools.chain(slice_starts, extra_slice_starts), 
+                         min_idle_len, 
+                         idle_thresh, 
+                         use_rms)
+
+def _get_idle_starts_sharded(signal, min_idle_len, idle_thresh, seek_step, 
+                             use_rms, num_workers, use_processes=True):
+    # split the slice starts into one contiguous block per worker. Every
+    # shard holds the samples of its slices plus a halo of min_idle_len, so
+    # each slice is checked exactly as in a serial run and the idle starts
+    # only need to be concatenated in order.
+    slice_starts, extra_slice_starts = _get_slice_starts(
+        len(signal), min_idle_len, seek_step)
+    shard_size = max(1, -(-len(slice_starts) // num_workers))
+    shards = [slice_starts[i:i + shard_size]
+              for i in range(0, len(slice_starts), shard_size)]
+    if extra_slice_starts:
+        shards.append(extra_slice_starts)
+    
+    executor_class = (ProcessPoolExecutor if use_processes 
+                      else ThreadPoolExecutor)
+    with executor_class(max_workers=min(num_workers, len(shards))) as executor:
+        futures = []
+        for shard_slice_starts in shards:
+            offset = shard_slice_starts[0]
+            futures.append(executor.submit(
+                _check_shard,
+                signal.iloc[offset:shard_slice_starts[-1] + min_idle_len],
+                offset,
+                range(0, 
+                      shard_slice_starts.stop - offset, 
+                      shard_slice_starts.step),
+                min_idle_len,
+                idle_thresh,
+                use_rms))
+        
+        idle_starts = []
+        for future in futures:
+            idle_starts.extend(future.result())
+    
+    log.debug(f'Checked {len(slice_starts) + len(extra_slice_starts)} '
+              f'slices in {len(shards)} shards')
+    return idle_starts
+
 def detect_idle(
         signal, 
         min_idle_len=1000, 
         idle_thresh=20, 
         seek_step=1,
-        use_rms=True
+        use_rms=True,
+        num_workers=1,
+        use_processes=True
     ):
     """Returns a list of all idle sections [start, end] as indices.
     Inverse of detect_nonidle()
@@ -103,23 +161,45 @@ def detect_idle(
                                      in absolute values. Defaults to 20.
         seek_step (int, optional):  step size for interating over the segment. 
                                     Defaults to 1.
+        use_rms (bool, optional): compare the RMS of each slice instead of 
+                                  its peak-to-peak value. Defaults to True.
+        num_workers (int, optional): number of shards the signal is split 
+                                     into and checked in parallel. The 
+                                     result is identical to a serial run. 
+                                     Use None for one shard per CPU. 
+                                     Defaults to 1 (serial).
+        use_processes (bool, optional): use a process pool for the shards, 
+                                        otherwise a thread pool. 
+                                        Defaults to True.
 
     Returns:
-        list: idle ranges
+        Segments: idle ranges
     """
     # you can't have an idle portion of a signal that is longer than the signal
     if len(signal) < min_idle_len:
-        return []
-
-    idle_starts = _get_idle_starts(signal, 
-                                   min_idle_len, 
-                                   idle_thresh, 
-                                   seek_step, 
-                                   use_rms)
+        return Segments()
+
+    if num_workers is None:
+        num_workers = os.cpu_count() or 1
+
+    if num_workers > 1:
+        idle_starts = _get_idle_starts_sharded(signal, 
+                                               min_idle_len, 
+                                               idle_thresh, 
+                                               seek_step, 
+                                               use_rms,
+                                               num_workers,
+                                               use_processes)
+    else:
+        idle_starts = _get_idle_starts(signal, 
+                                       min_idle_len, 
+                                       idle_thresh, 
+                                       seek_step, 
+                                       use_rms)
 
     # short circuit when there is no idle
     if not idle_starts:
-        return []
+        return Segments()
 
     idle_ranges = _get_idle_ranges(min_idle_len, seek_step, idle_starts)
 
@@ -127,33 +207,19 @@ def detect_idle(
 
 def _get_nonidle_ranges(idle_ranges, len_seg):
     # if there is no idle part, the whole signal is idle
-    if not idle_ranges:
-        return [[0, len_seg]]
+    if not len(idle_ranges):
+        return Segments([[0, len_seg]])
 
-    # short circuit when the whole signal is idle
-    if idle_ranges[0][0] == 0 and idle_ranges[0][1] == len_seg:
-        return []
-
-    prev_end_i = 0
-    end_i = 0
-    nonidle_ranges = []
-    for start_i, end_i in idle_ranges:
-        nonidle_ranges.append([prev_end_i, start_i])
-        prev_end_i = end_i
-
-    if end_i != len_seg:
-        nonidle_ranges.append([prev_end_i, len_seg])
-
-    if nonidle_ranges[0] == [0, 0]:
-        nonidle_ranges.pop(0)
-    
-    return nonidle_ranges
+    # empty gaps, e.g. when the whole signal is idle, are dropped
+    return Segments(idle_ranges).invert(len_seg)
 
 def detect_nonidle(
         signal, 
         min_idle_len=1000, 
         idle_thresh=20, 
-        seek_step=1
+        seek_step=1,
+        num_workers=1,
+        use_processes=True
     ):
     """
     Returns a list of all nonsilent sections [start, end] in milliseconds of 
@@ -163,18 +229,17 @@ def detect_nonidle(
     min_silence_len - the minimum length for any silent section
     silence_thresh - the upper bound for how quiet is silent in dFBS
     seek_step - step size for interating over the segment in ms
+    num_workers - number of shards checked in parallel (None: one per CPU),
+        see detect_idle()
+    use_processes - use a process pool for the shards, otherwise a thread 
+        pool. default: True
     """
-    idle_ranges = detect_idle(signal, min_idle_len, idle_thresh, seek_step)
+    idle_ranges = detect_idle(signal, min_idle_len, idle_thresh, seek_step,
+                              num_workers=num_workers, 
+                              use_processes=use_processes)
     
     return _get_nonidle_ranges(idle_ranges, len(signal))
 
-# from the itertools documentation
-def _pairwise(iterable):
-    "s -> (s0,s1), (s1,s2), (s2, s3), ..."
-    a, b = itertools.tee(iterable)
-    next(b, None)
-    return zip(a, b)
-
 def split_on_ranges(signal, ranges, keep_idle=100):
     """
     Returns list of audio segments from splitting audio_segment on silent 
@@ -197,20 +262,11 @@ def split_on_ranges(signal, ranges, keep_idle=100):
     if isinstance(keep_idle, bool):
         keep_idle = len(signal) if keep_idle else 0
 
-    output_ranges = [
-        [start - keep_idle, end + keep_idle] 
-        for (start,end) in ranges
-    ]
-
-    for range_i, range_ii in _pairwise(output_ranges):
-        last_end = range_i[1]
-        next_start = range_ii[0]
-        if next_start < last_end:
-            range_i[1] = (last_end + next_start) // 2
-            range_ii[0] = range_i[1]
+    output_ranges = Segments(ranges).dilate(keep_idle).split_overlaps()
+    output_ranges = output_ranges.clip(0, len(signal))
 
     return [
-        signal.iloc[max(start,0):min(end,len(signal))]
+        signal.iloc[start:end]
         for start,end in output_ranges
     ]
 
@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+"""
+Overlapped asyncio pipeline for loading, splitting and exporting measurements.
+
+Copyright (C) 2022  Lars Schönemann
+Leibniz Institut für Werkstofforientierte Technologien IWT, Bremen, Germany
+
+Permission is hereby granted, free of charge, to any person obtaining a copy 
+of this software and associated documentation files (the "Software"), to deal 
+in the Software without restriction, including without limitation the rights 
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell 
+copies of the Software, and to permit persons to whom the Software is 
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all 
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, 
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE 
+SOFTWARE.
+"""
+import asyncio
+import functools
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+from .features import export_features, extract_features
+from .filehandling import (export_chunks, get_sampling_rate,
+                           get_start_from_filename, load_mesusoft_measurement)
+from .idle import split_on_ranges
+from .processdataframe import detect_force_ranges, resulting_force
+
+log = logging.getLogger(__package__)
+
+STAGES = ('load', 'compute', 'export')
+
+class Pipeline:
+    """Staged pipeline load -> compute -> export connected by bounded queues.
+
+    The next file is loaded while the current one is split on idle and the
+    chunks are written by a concurrent export stage, so the throughput 
+    approaches the one of the slowest stage. Loading and exporting run in a 
+    thread pool, the idle detection in a process pool and the chunk features
+    in a separate thread pool on the already loaded dataframe.
+
+    Args:
+        export_dir (str): directory for the exported chunks
+        queue_size (int, optional): number of items buffered between two 
+                                    stages. Defaults to 1.
+        compute_tasks (int, optional): number of files split in parallel. 
+                                       Defaults to 1.
+        implicit_time (bool, optional): load without the time channel, see 
+                                        load_mesusoft_measurement(). 
+                                        Defaults to False.
+        features (bool, optional): also save the chunk features, see 
+                                   extract_features(). Defaults to True.
+        **kwargs: passed on to the idle detection, see chop_dataframe(), 
+                  and to extract_features()
+    """
+    def __init__(self, export_dir, queue_size=1, compute_tasks=1, **kwargs):
+        self.export_dir = export_dir
+        self.queue_size = queue_size
+        self.compute_tasks = compute_tasks
+        self.kwargs = kwargs
+        self.metrics = {}
+        self._reports = {}
+
+    def _reset_metrics(self):
+        self.metrics = {
+            stage: {'items': 0, 
+                    'busy_time': 0.0, 
+                    'input_wait_time': 0.0, 
+                    'output_wait_time': 0.0, 
+                    'max_queue_size': 0}
+            for stage in STAGES}
+        self.metrics['wall_time'] = 0.0
+
+    async def _get(self, stage, queue):
+        # time spent waiting for input, i.e. upstream is slower
+        start_time = time.perf_counter()
+        item = await queue.get()
+        self.metrics[stage]['input_wait_time'] += \
+            time.perf_counter() - start_time
+        return item
+
+    async def _put(self, stage, queue, item):
+        # time spent waiting for space in the queue, i.e. backpressure
+        start_time = time.perf_counter()
+        await queue.put(item)
+        self.metrics[stage]['output_wait_time'] += \
+            time.perf_counter() - start_time
+        self.metrics[stage]['max_queue_size'] = max(
+            self.metrics[stage]['max_queue_size'], queue.qsize())
+
+    async def _run_stage_step(self, stage, executor, func, *args):
+        start_time = time.perf_counter()
+        result = await asyncio.get_running_loop().run_in_executor(
+            executor, func, *args)
+        self.metrics[stage]['busy_time'] += time.perf_counter() - start_time
+        return result
+
+    async def _load(self, file_names, out_queue, io_executor):
+        for file_name in file_names:
+            try:
+                measurement_df, metadata = await self._run_stage_step(
+                    'load', io_executor, load_mesusoft_measurement, 
+                    Path(file_name), self.kwargs.get('implicit_time', False))
+            except Exception as load_exception:  # pylint: disable=W0703
+                log.error(f'Loading {file_name} failed: {load_exception}')
+                self._reports[file_name]['error'] = load_exception
+                continue
+            self.metrics['load']['items'] += 1
+            await self._put(
+                'load', out_queue, (file_name, measurement_df, metadata))
+        for _ in range(self.compute_tasks):
+            await out_queue.put(None)
+
+    async def _compute(self, in_queue, out_queue, cpu_executor, 
+                       feature_executor):
+        while True:
+            item = await self._get('compute', in_queue)
+            if item is None:
+                break
+            file_name, measurement_df, metadata = item
+            try:
+                sampling_rate = \
+                    metadata['GroupProperties']['SamplingRate'] \
+                    if 'SamplingRate' in metadata['GroupProperties'] \
+                    else get_sampling_rate(measurement_df)
+                # only the resulting force is sent to the worker process, 
+                # splitting returns views and is done here
+                ranges = await self._run_stage_step(
+                    'compute', cpu_executor, detect_force_ranges, 
+                    resulting_force(measurement_df), 
+                    sampling_rate,
+                    self.kwargs.get('default_threshold', 50.0),
+                    self.kwargs.get('seek_step_ratio', 0.025),
+                    self.kwargs.get('num_workers', 1),
+                    self.kwargs.get('use_processes', True))
+                cutting_signals = split_on_ranges(
+                    measurement_df, ranges, keep_idle=0)
+                # the features work on the dataframe of this process
+                features_df = None
+                if self.kwargs.get('features', True):
+                    features_df = await self._run_stage_step(
+                        'compute', feature_executor, functools.partial(
+                            extract_features, measurement_df, ranges, 
+                            **{**self.kwargs, 
+                               'sampling_rate': sampling_rate}))
+            except Exception as compute_exception:  # pylint: disable=W0703
+                log.error(f'Processing {file_name} failed: '
+                          f'{compute_exception}')
+                self._reports[file_name]['error'] = compute_exception
+                continue
+            self.metrics['compute']['items'] += 1
+            log.info(f'Detected {len(cutting_signals)} nonidle segments in '
+                     f'{file_name}.')
+            await self._put(
+                'compute', out_queue, 
+                (file_name, cutting_signals, metadata, features_df))
+
+    def _export_file(self, file_name, cutting_signals, metadata, features_df):
+        start_num = get_start_from_filename(
+            file_name, len(cutting_signals), 
+            self.kwargs.get('identifier', 'n'))
+        export_name = Path(self.export_dir).joinpath(Path(file_name).name)
+        export_chunks(export_name, metadata, cutting_signals, start_num)
+        if features_df is not None:
+            export_features(export_name, features_df)
+
+    async def _export(self, in_queue, io_executor):
+        while True:
+            item = await self._get('export', in_queue)
+            if item is None:
+                break
+            file_name, cutting_signals = item[:2]
+            try:
+                await self._run_stage_step(
+                    'export', io_executor, self._export_file, *item)
+            except Exception as export_exception:  # pylint: disable=W0703
+                log.error(f'Exporting {file_name} failed: {export_exception}')
+                self._reports[file_name]['error'] = export_exception
+                continue
+            self.metrics['export']['items'] += 1
+            self._reports[file_name]['num_chunks'] = len(cutting_signals)
+
+    async def run_async(self, file_names):
+        """Process the files, see run()."""
+        self._reset_metrics()
+        self._reports = {file_name: {'file_name': file_name,
+                                     'num_chunks': None,
+                                     'error': None}
+                         for file_name in file_names}
+        load_queue = asyncio.Queue(maxsize=self.queue_size)
+        export_queue = asyncio.Queue(maxsize=self.queue_size)
+        
+        start_time = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=2) as io_executor, \
+                ProcessPoolExecutor(max_workers=self.compute_tasks) \
+                as cpu_executor, \
+                ThreadPoolExecutor(max_workers=self.compute_tasks) \
+                as feature_executor:
+            compute_tasks = [
+                asyncio.create_task(
+                    self._compute(load_queue, export_queue, cpu_executor, 
+                                  feature_executor))
+                for _ in range(self.compute_tasks)]
+            
+            async def finish_compute():
+                await asyncio.gather(*compute_tasks)
+                await export_queue.put(None)
+            
+            tasks = [
+                asyncio.create_task(
+                    self._load(file_names, load_queue, io_executor)),
+                asyncio.create_task(finish_compute()),
+                asyncio.create_task(self._export(export_queue, io_executor))]
+            try:
+                await asyncio.gather(*tasks)
+            except Exception as stage_exception:  # pylint: disable=W0703
+                # a failed stage would leave the others waiting on the 
+                # queues forever, stop all of them instead
+                log.error(f'Pipeline stopped: {stage_exception}')
+                for task in tasks + compute_tasks:
+                    task.cancel()
+                await asyncio.gather(
+                    *tasks, *compute_tasks, return_exceptions=True)
+                for report in self._reports.values():
+                    if report['num_chunks'] is None and not report['error']:
+                        report['error'] = stage_exception
+        self.metrics['wall_time'] = time.perf_counter() - start_time
+        
+        for stage in STAGES:
+            log.info(f'Stage {stage}: {self.metrics[stage]["items"]} items, '
+                     f'occupancy {self.occupancy(stage) * 100:.0f} %, '
+                     f'waited {self.metrics[stage]["output_wait_time"]:.1f} s '
+                     f'on backpressure')
+        return [self._reports[file_name] for file_name in file_names]
+
+    def run(self, file_names):
+        """Load, split and export the given files.
+
+        Args:
+            file_names (list of str): the TDMS files to process
+
+        Returns:
+            list of dict: one report per file (in order of file_names) with 
+                          keys 'file_name', 'num_chunks' and 'error'
+        """
+        return asyncio.run(self.run_async(file_names))
+
+    def occupancy(self, stage):
+        """Fraction of the wall time a stage was busy.
+
+        Args:
+            stage (str): one of 'load', 'compute' or 'export'
+
+        Returns:
+            float: occupancy, may exceed 1 for parallel compute tasks
+        """
+        if not self.metrics or not self.metrics['wall_time']:
+            return 0.0
+        return self.metrics[stage]['busy_time'] / self.metrics['wall_time']
@@ -30,6 +30,7 @@ import numpy as np
 import matplotlib  # pylint: disable=W0611
 import matplotlib.pyplot as plt
 from matplotlib.widgets import SpanSelector
+from .filehandling import get_sampling_rate
 from .idle import detect_nonidle, split_on_ranges
 
 log = logging.getLogger(__package__)
@@ -39,16 +40,99 @@ def onselect(vmin, vmax):
     print(f'min =  {vmin}, max = {vmax}')
     print(f'span =  {vmax - vmin}')
     
+def resulting_force(measurement_df):
+    """Calculate resulting force F_res = sqrt(Fx^2+Fy^2+Fz^2)
+    Assumption: first three columns contain force values for x,y,z
+
+    Args:
+        measurement_df (pd.dataframe): the measurement
+
+    Returns:
+        pd.Series: resulting force
+    """
+    return np.sqrt(measurement_df[measurement_df.columns[0]]**2 
+                 + measurement_df[measurement_df.columns[1]]**2 
+                 + measurement_df[measurement_df.columns[2]]**2)
+
+def detect_force_ranges(f_res_df, sampling_rate, idle_threshold, 
+                        seek_step_ratio, num_workers=1, use_processes=True):
+    """Detect the nonidle ranges of a resulting force.
+    The seek step is based on the actual sampling rate.
+
+    Args:
+        f_res_df (pd.Series): resulting force, see resulting_force()
+        sampling_rate (float): sampling rate of the measurement
+        idle_threshold (float): idle threshold
+        seek_step_ratio (float): seek step relative to the sampling rate
+        num_workers (int, optional): see detect_nonidle(). Defaults to 1.
+        use_processes (bool, optional): see detect_nonidle(). 
+                                        Defaults to True.
+
+    Returns:
+        Segments: the nonidle ranges
+    """
+    log.info(f'Sampling rate is {sampling_rate} -> using seek step of '
+               f'{int(np.ceil(sampling_rate*seek_step_ratio))} '
+               f'({seek_step_ratio*100} %)')
+    return detect_nonidle(
+        f_res_df, 
+        seek_step=int(np.ceil(sampling_rate*seek_step_ratio)), 
+        idle_thresh=idle_threshold,
+        num_workers=num_workers,
+        use_processes=use_processes)
+
+def detect_cutting_ranges(measurement_df, **kwargs):
+    """Detect the nonidle ranges of a measurement without user interaction.
+    The idle detection is applied to the resulting force with a fixed 
+    threshold, see chop_dataframe() for the arguments.
+
+    Returns:
+        Segments: the nonidle ranges
+    """
+    sampling_rate = kwargs.get(
+        'sampling_rate', 
+        get_sampling_rate(measurement_df))
+    return detect_force_ranges(
+        resulting_force(measurement_df),
+        sampling_rate,
+        kwargs.get('default_threshold', 50.0),
+        kwargs.get('seek_step_ratio', 0.025),
+        kwargs.get('num_workers', 1),
+        kwargs.get('use_processes', True))
+
+def chop_dataframe(measurement_df, **kwargs):
+    """Split a measurement into its nonidle segments without user interaction.
+    Same as process_dataframe() but with a fixed threshold and no plots, 
+    e.g. for batch processing.
+
+    Args:
+        measurement_df (pd.dataframe): the measurement, the first three 
+                                       columns are used as force x,y,z
+        sampling_rate (float, optional): Defaults to the inverse of the 
+                                         first index step.
+        default_threshold (float, optional): idle threshold. Defaults to 50.0
+        seek_step_ratio (float, optional): seek step relative to the 
+                                           sampling rate. Defaults to 0.025
+        num_workers (int, optional): see detect_nonidle(). Defaults to 1.
+        use_processes (bool, optional): see detect_nonidle(). 
+                                        Defaults to True.
+
+    Returns:
+        list of dataframes: the nonidle segments
+    """
+    cutting_signals = split_on_ranges(
+        measurement_df, 
+        detect_cutting_ranges(measurement_df, **kwargs), 
+        keep_idle=0)
+    log.info(f'Detected {len(cutting_signals)} nonidle segments.')
+    return cutting_signals
+
 def process_dataframe(measurement_df, **kwargs):
-    # Calculate resulting force F_res = sqrt(Fx^2+Fy^2+Fz^2)
-    # Assumption: first three columns contain force values for x,y,z
-    f_res_df = np.sqrt(measurement_df[measurement_df.columns[0]]**2 
-                     + measurement_df[measurement_df.columns[1]]**2 
-                     + measurement_df[measurement_df.columns[2]]**2)
+    f_res_df = resulting_force(measurement_df)
 
     sampling_rate = kwargs.get(
         'sampling_rate', 
-        1/(measurement_df.index[1]-measurement_df.index[0]))
+        get_sampling_rate(measurement_df))
     idle_threshold = kwargs.get(
         'default_threshold', 50.0)
     seek_step_ratio = kwargs.get(
@@ -72,14 +156,13 @@ def process_dataframe(measurement_df, **kwargs):
         idle_threshold = span.extents[1] - span.extents[0]
     log.info(f'selected threshold =  {idle_threshold}')
     
-    # detect nonidle segments, seek step is based on actual sampling rate
-    log.info(f'Sampling rate is {sampling_rate} -> using seek step of '
-               f'{int(np.ceil(sampling_rate*seek_step_ratio))} '
-               f'({seek_step_ratio*100} %)')
-    ranges = detect_nonidle(
+    ranges = detect_force_ranges(
         f_res_df, 
-        seek_step=int(np.ceil(sampling_rate*seek_step_ratio)), 
-        idle_thresh=idle_threshold)
+        sampling_rate, 
+        idle_threshold, 
+        seek_step_ratio, 
+        kwargs.get('num_workers', 1),
+        kwargs.get('use_processes', True))
     
     # split signals at detected ranges
     cutting_signals = split_on_ranges(
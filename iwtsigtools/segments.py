@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""
+Array-backed index ranges with vectorized interval algebra.
+
+Copyright (C) 2022  Lars Schönemann
+Leibniz Institut für Werkstofforientierte Technologien IWT, Bremen, Germany
+
+Permission is hereby granted, free of charge, to any person obtaining a copy 
+of this software and associated documentation files (the "Software"), to deal 
+in the Software without restriction, including without limitation the rights 
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell 
+copies of the Software, and to permit persons to whom the Software is 
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all 
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, 
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE 
+SOFTWARE.
+"""
+import numpy as np
+
+class Segments:
+    """Index ranges [start, end) backed by an (N, 2) int64 array.
+
+    Behaves like the list of [start, end] lists used before, i.e. it can be 
+    iterated, indexed and compared to such a list, but all interval 
+    operations are vectorized and return new Segments.
+
+    The ranges are immutable, the array is copied on creation and read-only.
+
+    Args:
+        ranges (array-like, optional): (N, 2) start and end indices. 
+                                       Defaults to no ranges.
+    """
+    __slots__ = ('_ranges',)
+
+    def __init__(self, ranges=()):
+        if isinstance(ranges, Segments):
+            self._ranges = ranges._ranges
+            return
+        self._ranges = np.array(ranges, dtype=np.int64).reshape(-1, 2)
+        self._ranges.flags.writeable = False
+
+    @classmethod
+    def from_bounds(cls, starts, ends):
+        """Create Segments from separate arrays of starts and ends."""
+        return cls(np.column_stack((np.asarray(starts, dtype=np.int64), 
+                                    np.asarray(ends, dtype=np.int64))))
+
+    @property
+    def starts(self):
+        """np.ndarray: start indices"""
+        return self._ranges[:, 0]
+
+    @property
+    def ends(self):
+        """np.ndarray: end indices (exclusive)"""
+        return self._ranges[:, 1]
+
+    @property
+    def lengths(self):
+        """np.ndarray: number of samples of each range"""
+        return self.ends - self.starts
+
+    def __len__(self):
+        return len(self._ranges)
+
+    def __iter__(self):
+        return iter(self._ranges.tolist())
+
+    def __getitem__(self, item):
+        if isinstance(item, (int, np.integer)):
+            return self._ranges[item].tolist()
+        return Segments(self._ranges[item])
+
+    def __eq__(self, other):
+        if isinstance(other, Segments):
+            return np.array_equal(self._ranges, other._ranges)
+        try:
+            other = np.asarray(other)
+        except (TypeError, ValueError):
+            return NotImplemented
+        # only (N, 2) ranges or an empty sequence (no ranges) are comparable
+        if other.size == 0 and other.ndim <= 2:
+            return len(self) == 0
+        if other.ndim != 2 or other.shape[1] != 2:
+            return NotImplemented
+        return np.array_equal(self._ranges, other)
+
+    __hash__ = None
+
+    def __array__(self, dtype=None, copy=None):
+        if copy:
+            return self._ranges.astype(dtype or self._ranges.dtype)
+        if dtype is None or np.dtype(dtype) == self._ranges.dtype:
+            # read-only view, the ranges cannot be changed through it
+            return self._ranges
+        if copy is False:
+            raise ValueError('Segments cannot be converted to '
+                             f'{np.dtype(dtype)} without a copy')
+        return self._ranges.astype(dtype)
+
+    def __repr__(self):
+        return f'Segments({self._ranges.tolist()})'
+
+    def tolist(self):
+        """Return the ranges as list of [start, end] lists."""
+        return self._ranges.tolist()
+
+    def invert(self, length):
+        """Ranges not covered within [0, length], empty gaps are dropped.
+        Expects sorted, non-overlapping ranges.
+
+        Args:
+            length (int): length of the signal
+
+        Returns:
+            Segments: the complement
+        """
+        bounds = np.concatenate(([0], self._ranges.ravel(), [length]))
+        inverted = bounds.reshape(-1, 2)
+        return Segments(inverted[inverted[:, 1] > inverted[:, 0]])
+
+    def dilate(self, amount):
+        """Extend each range by amount on both sides (negative to shrink).
+        Overlaps are not resolved, see merge() and split_overlaps()."""
+        return Segments(self._ranges + np.array([-amount, amount]))
+
+    def clip(self, lower, upper):
+        """Limit all indices to [lower, upper]."""
+        return Segments(np.clip(self._ranges, lower, upper))
+
+    def split_overlaps(self):
+        """Split overlaps of neighbouring ranges evenly between both ranges.
+
+        Returns:
+            Segments: ranges where each end is at most the next start
+        """
+        ranges = self._ranges.copy()
+        last_ends = ranges[:-1, 1]
+        next_starts = ranges[1:, 0]
+        overlap = next_starts < last_ends
+        middle = (last_ends + next_starts) // 2
+        ranges[:-1, 1] = np.where(overlap, middle, last_ends)
+        ranges[1:, 0] = np.where(overlap, middle, next_starts)
+        return Segments(ranges)
+
+    def merge(self):
+        """Combine overlapping or adjacent ranges.
+
+        Returns:
+            Segments: sorted, non-overlapping ranges
+        """
+        if not len(self):
+            return Segments()
+        ranges = self._ranges[np.argsort(self.starts, kind='stable')]
+        running_end = np.maximum.accumulate(ranges[:, 1])
+        # a new range starts where the start lies behind all previous ends
+        is_new = np.concatenate(([True], ranges[1:, 0] > running_end[:-1]))
+        first = np.flatnonzero(is_new)
+        last = np.concatenate((first[1:], [len(ranges)])) - 1
+        return Segments.from_bounds(ranges[first, 0], running_end[last])
+
+    def intersect(self, other):
+        """Ranges covered by both self and other.
+        Expects both to be sorted and non-overlapping, see merge().
+
+        Args:
+            other (Segments or array-like): the ranges to intersect with
+
+        Returns:
+            Segments: the intersection
+        """
+        other = Segments(other)
+        # for each range the block of ranges in other it may overlap with
+        first = np.searchsorted(other.ends, self.starts, side='right')
+        last = np.searchsorted(other.starts, self.ends, side='left')
+        counts = np.maximum(last - first, 0)
+        own = np.repeat(np.arange(len(self)), counts)
+        offsets = np.arange(counts.sum()) - np.repeat(
+            np.cumsum(counts) - counts, counts)
+        theirs = np.repeat(first, counts) + offsets
+        
+        starts = np.maximum(self.starts[own], other.starts[theirs])
+        ends = np.minimum(self.ends[own], other.ends[theirs])
+        keep = ends > starts
+        return Segments.from_bounds(starts[keep], ends[keep])
+
+    def filter_min_length(self, min_length):
+        """Keep only ranges with at least min_length samples."""
+        return Segments(self._ranges[self.lengths >= min_length])
+
+    def to_time(self, index, increment=None, start_offset=0.0):
+        """Convert to time (or any other index) values.
+
+        Args:
+            index (array-like): the index of the signal, e.g. dataframe.index
+            increment (float, optional): time between two samples if the 
+                                         index is the sample offset, i.e. 
+                                         implicit time. Defaults to None.
+            start_offset (float, optional): time of sample 0 for implicit 
+                                            time. Defaults to 0.0.
+
+        Returns:
+            np.ndarray: (N, 2) index values of the first and last sample
+        """
+        index = np.asarray(index)
+        times = np.column_stack((
+            index[self.starts], 
+            index[np.maximum(self.ends - 1, self.starts)]))
+        if increment is not None:
+            times = start_offset + times * increment
+        return times